@@ -1,23 +1,165 @@
 #!/usr/bin/python3
 """Pascal Triangle Interview Challenge"""
 
+import sys
+import threading
 
-def pascal_triangle(n):
+
+def pascal_rows(n=None, mod=None):
+    """yields the rows of the pascal triangle one at a time, n of
+    them or forever if n is None; only the last row is kept
+
+    With mod, every number is reduced modulo mod, so the rows stay
+    small ints instead of growing without bound."""
+    if mod is None:
+        one = 1
+        row = [1]
+    else:
+        one = 1 % mod
+        row = [one]
+    i = 0
+    while n is None or i < n:
+        yield row
+        if mod is None:
+            row = [1] + [a + b for a, b in zip(row, row[1:])] + [1]
+        else:
+            row = [one] + [(a + b) % mod
+                           for a, b in zip(row, row[1:])] + [one]
+        i += 1
+
+
+def pascal_row(k):
+    """returns row k (the one starting with 1, k) of the pascal triangle,
+    computed directly from C(k, i + 1) = C(k, i) * (k - i) / (i + 1)"""
+    if k < 0:
+        return []
+
+    half = [1]
+    for i in range(k // 2):
+        half.append(half[-1] * (k - i) // (i + 1))
+
+    if k % 2:
+        return half + half[::-1]
+    return half + half[-2::-1]
+
+
+class PascalCache:
+    """shared prefix of the pascal triangle, kept under max_bytes
+
+    A request for n rows reuses the rows already computed and only
+    adds the missing ones. Rows are stored as tuples, so the rows
+    handed out can't be changed behind the cache's back. When the
+    cache grows over max_bytes, rows are dropped from the bottom so
+    what is left is still a prefix of the triangle."""
+
+    def __init__(self, max_bytes=64 * 1024 * 1024):
+        """creates an empty cache holding at most about max_bytes"""
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._rows = []
+        self._sizes = []
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def rows(self, n):
+        """returns the first n rows of the triangle as a tuple of
+        tuples, counting a hit if they were all cached, else a miss"""
+        if n <= 0:
+            return ()
+
+        with self._lock:
+            rows = self._rows
+            if n <= len(rows):
+                self.hits += 1
+                return tuple(rows[:n])
+
+            self.misses += 1
+            while len(rows) < n:
+                if rows:
+                    prev = rows[-1]
+                    row = (1,) + tuple(a + b for a, b in
+                                       zip(prev, prev[1:])) + (1,)
+                else:
+                    row = (1,)
+                size = sys.getsizeof(row) + sum(sys.getsizeof(x)
+                                                for x in row)
+                rows.append(row)
+                self._sizes.append(size)
+                self._bytes += size
+
+            result = tuple(rows[:n])
+            while self._bytes > self.max_bytes:
+                rows.pop()
+                self._bytes -= self._sizes.pop()
+            return result
+
+    def clear(self):
+        """drops every cached row, keeping the counters"""
+        with self._lock:
+            self._rows = []
+            self._sizes = []
+            self._bytes = 0
+
+    def stats(self):
+        """returns the counters and the current size of the cache"""
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses,
+                    'rows': len(self._rows), 'bytes': self._bytes}
+
+
+triangle_cache = PascalCache()
+
+
+def pascal_triangle(n, mod=None):
     """returns a list of lists of numbers
-    representing the pascal triangle"""
+    representing the pascal triangle
+
+    Rows come from triangle_cache and are copied into fresh lists.
+    With mod, the numbers are reduced modulo mod and the rows are
+    computed directly instead."""
     if n <= 0:
         return []
+    if mod is not None:
+        return [list(row) for row in pascal_rows(n, mod)]
 
-    triangle = [[1]]
+    return [list(row) for row in triangle_cache.rows(n)]
 
-    for i in range(1, n):
-        prev_row = triangle[-1]
-        new_row = [1]
 
-        for j in range(1, i):
-            new_row.append(prev_row[j - 1] + prev_row[j])
+def pascal_packed(n, mod=None, dtype=None):
+    """returns the first n rows of the pascal triangle packed one after
+    the other in a single NumPy array, row i starting at i * (i + 1) / 2
+
+    Each row is the previous one added to itself shifted by one, done
+    as a single vectorized add into the packed array. The numbers are
+    reduced modulo mod if given, and otherwise wrap around at the width
+    of dtype (uint64 by default). Requires NumPy."""
+    import numpy as np
+
+    if dtype is None:
+        dtype = np.uint64
+    if mod is not None and not 0 < mod <= np.iinfo(dtype).max // 2 + 1:
+        raise ValueError('mod must be between 1 and {}'.format(
+            np.iinfo(dtype).max // 2 + 1))
+    if n <= 0:
+        return np.zeros(0, dtype=dtype)
+
+    one = 1 if mod is None else 1 % mod
+    packed = np.empty(n * (n + 1) // 2, dtype=dtype)
+    packed[0] = one
+    start = 0
+    for i in range(1, n):
+        prev = packed[start:start + i]
+        start += i
+        row = packed[start:start + i + 1]
+        row[0] = row[i] = one
+        np.add(prev[:-1], prev[1:], out=row[1:i])
+        if mod is not None:
+            np.remainder(row[1:i], mod, out=row[1:i])
+    return packed
 
-        new_row.append(1)
-        triangle.append(new_row)
 
-    return triangle
+def packed_row(packed, i):
+    """returns row i of a triangle made by pascal_packed, as a view"""
+    start = i * (i + 1) // 2
+    return packed[start:start + i + 1]
@@ -4,23 +4,113 @@
     result in exactly n 'H' characters in the file.
 """
 
+from array import array
+
+
+def prime_factors(n):
+    """
+    Returns the prime factors of n in ascending order, repeated
+    as many times as they divide n (none for n < 2).
+    """
+    factors = []
+    if n < 2:
+        return factors
+
+    while n % 2 == 0:
+        factors.append(2)
+        n //= 2
+
+    factor = 3
+    while factor * factor <= n:
+        while n % factor == 0:
+            factors.append(factor)
+            n //= factor
+        factor += 2
+
+    if n > 1:
+        factors.append(n)
+    return factors
+
 
 def minOperations(n):
     """
     Calculate the fewest number of operations needed to
     result in exactly n 'H' characters in the file.
+
+    Growing the file by a factor p costs one Copy All and p - 1
+    Paste, so the answer is the sum of the prime factors of n.
+    """
+    return sum(prime_factors(n))
+
+
+def minOperations_sequence(n):
+    """
+    Returns an optimal sequence of operations to reach n 'H'
+    characters, as one (copies, pastes) pair per prime factor p
+    of n: Copy All once, then Paste p - 1 times.
+
+    The sequence has O(log n) pairs; the total of all the pairs
+    is minOperations(n).
     """
-    if n == 1:
-        return 0
+    return [(1, p - 1) for p in prime_factors(n)]
 
-    operations = 0
-    paste_buffer = 1
-    clipboard = 1
 
-    while paste_buffer < n:
-        if n % paste_buffer == 0:
-            clipboard = paste_buffer
-            operations += 1
-        paste_buffer += clipboard
-        operations += 1
-    return operations
+def expand_sequence(sequence):
+    """
+    Yields the operations of a sequence from minOperations_sequence
+    one at a time, as 'Copy All' and 'Paste'.
+    """
+    for copies, pastes in sequence:
+        for _ in range(copies):
+            yield 'Copy All'
+        for _ in range(pastes):
+            yield 'Paste'
+
+
+def smallest_prime_factors(limit):
+    """
+    Returns an array where entry k is the smallest prime factor
+    of k for 2 <= k <= limit, and 0 for primes, 0 and 1.
+    """
+    spf = array('I', bytes(4 * (limit + 1)))
+    root = int(limit ** 0.5)
+    while (root + 1) * (root + 1) <= limit:
+        root += 1
+
+    is_prime = bytearray([1]) * (root + 1)
+    for p in range(2, int(root ** 0.5) + 1):
+        if is_prime[p]:
+            is_prime[p * p::p] = bytes(len(range(p * p, root + 1, p)))
+
+    # larger primes first, so smaller ones overwrite their multiples
+    for p in range(root, 1, -1):
+        if is_prime[p]:
+            count = len(range(p * p, limit + 1, p))
+            spf[p * p::p] = array('I', [p]) * count
+    return spf
+
+
+def minOperations_batch(ns, limit=10 ** 7):
+    """
+    Calculate minOperations(n) for every n in ns, returned as a list.
+
+    The values up to limit are factored with one shared smallest
+    prime factor sieve, sized for the largest of them; the ones
+    above limit fall back to minOperations.
+    """
+    ns = list(ns)
+    top = max([n for n in ns if n <= limit] or [1])
+    spf = smallest_prime_factors(top)
+
+    results = []
+    for n in ns:
+        if n > limit:
+            results.append(minOperations(n))
+            continue
+        operations = 0
+        while n > 1:
+            p = spf[n] or n
+            operations += p
+            n //= p
+        results.append(operations)
+    return results
@@ -0,0 +1,28 @@
+#!/usr/bin/python3
+"""
+1-main: checks minOperations_batch against minOperations, and both
+against a direct search for the small values
+"""
+minops = __import__('0-minoperations')
+
+if __name__ == "__main__":
+    top = 2000
+    # fewest operations for n: copy the file at some d dividing n,
+    # then paste n / d - 1 times
+    best = [0, 0] + [None] * (top - 1)
+    for n in range(2, top + 1):
+        best[n] = min(best[d] + n // d for d in range(1, n) if n % d == 0)
+
+    ns = list(range(top + 1))
+    batch = minops.minOperations_batch(ns)
+    scalar = [minops.minOperations(n) for n in ns]
+    print("0..{}: batch {}, scalar {}".format(
+        top, "OK" if batch == scalar else "differs",
+        "OK" if scalar == best else "differs"))
+
+    # values above the sieve limit fall back to minOperations
+    ns = [10 ** 6 + k for k in range(200)] + [2 ** 31 - 1, 3 ** 19]
+    batch = minops.minOperations_batch(ns, limit=10 ** 6 + 100)
+    scalar = [minops.minOperations(n) for n in ns]
+    print("above the limit: {}".format("OK" if batch == scalar else
+                                       "differs"))
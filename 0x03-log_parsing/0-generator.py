@@ -1,15 +1,131 @@
 #!/usr/bin/python3
+'''Writes access log lines for 0-stats.py
+
+With no arguments, writes 10000 lines to stdout, sleeping a random
+time under a second before each one. Options:
+    --count=N          number of lines (10000)
+    --rate=R           lines per second, 0 for as fast as possible
+    --seed=S           seed for the random values; the dates then start
+                       at 2017-02-05 and move on 1 / R second per line
+                       (1 ms when unthrottled), so the output is the same
+                       on every run
+    --codes=C:W,...    status codes and their weights (the 8 codes, evenly)
+    --sizes=MIN-MAX    range of the file sizes (1-1024)
+    --malformed=P      share of lines 0-stats.py must skip or not count
+                       under a code (0)
+    --output=FILE      file to write to instead of stdout
+'''
 import random
 import sys
-from time import sleep
+from bisect import bisect
+from itertools import accumulate
+from time import sleep, time
 import datetime
 
-for i in range(10000):
-    sleep(random.random())
-    sys.stdout.write("{:d}.{:d}.{:d}.{:d} - [{}] \"GET /projects/260 HTTP/1.1\" {} {}\n".format(
-        random.randint(1, 255), random.randint(1, 255), random.randint(1, 255), random.randint(1, 255),
-        datetime.datetime.now(),
-        random.choice([200, 301, 400, 401, 403, 404, 405, 500]),
-        random.randint(1, 1024)
-    ))
-    sys.stdout.flush()
+CODES = [200, 301, 400, 401, 403, 404, 405, 500]
+LINE = "{:d}.{:d}.{:d}.{:d} - [{}] \"GET /projects/260 HTTP/1.1\" {} {}\n"
+MALFORMED = [
+    "{0:d}.{1:d}.{2:d}.{3:d} - [{4}]\n",
+    "{0:d}.{1:d}.{2:d}.{3:d} - [{4}] \"GET /projects/260 HTTP/1.1\" "
+    "ERR {6}\n",
+    "{0:d}.{1:d}.{2:d}.{3:d}\n",
+]
+
+
+def generate(count=10000, rate=None, seed=None, codes=None, sizes=(1, 1024),
+             malformed=0.0, out=None):
+    '''writes count log lines to out (stdout by default)
+
+    rate is in lines per second, 0 to write as fast as possible, or
+    None to sleep a random time under a second before every line.
+    codes maps status codes to weights. A malformed line either has
+    too few fields or a status code that is not a number, never a
+    size that is not one, since that would stop 0-stats.py.'''
+    if out is None:
+        out = sys.stdout
+    rand = random.Random(seed)
+    randint = rand.randint
+    if codes is None:
+        codes = dict.fromkeys(CODES, 1)
+    population = list(codes)
+    weights = list(accumulate(codes[code] for code in population))
+    low, high = sizes
+
+    clock = None
+    if seed is not None:
+        clock = datetime.datetime(2017, 2, 5)
+        step = datetime.timedelta(seconds=1 / rate if rate else 0.001)
+    start = time()
+    buffer = []
+
+    for i in range(count):
+        if rate is None:
+            sleep(rand.random())
+        elif rate:
+            delay = start + i / rate - time()
+            if delay > 0:
+                out.write(''.join(buffer))
+                out.flush()
+                buffer = []
+                sleep(delay)
+
+        if clock is None:
+            now = datetime.datetime.now()
+        else:
+            now = clock
+            clock += step
+        template = LINE
+        if malformed and rand.random() < malformed:
+            template = rand.choice(MALFORMED)
+        buffer.append(template.format(
+            randint(1, 255), randint(1, 255), randint(1, 255), randint(1, 255),
+            now,
+            population[bisect(weights, rand.random() * weights[-1])],
+            randint(low, high)
+        ))
+
+        if rate is None or len(buffer) >= 1024:
+            out.write(''.join(buffer))
+            out.flush()
+            buffer = []
+
+    out.write(''.join(buffer))
+    out.flush()
+
+
+def parse_options(argv):
+    '''returns the keyword arguments of generate given by argv'''
+    kwargs = {}
+    for arg in argv:
+        name, _, value = arg.lstrip('-').partition('=')
+        if name == 'count':
+            kwargs['count'] = int(value)
+        elif name == 'rate':
+            kwargs['rate'] = float(value)
+        elif name == 'seed':
+            kwargs['seed'] = int(value)
+        elif name == 'codes':
+            kwargs['codes'] = {}
+            for pair in value.split(','):
+                code, _, weight = pair.partition(':')
+                kwargs['codes'][int(code)] = float(weight or 1)
+        elif name == 'sizes':
+            low, _, high = value.partition('-')
+            kwargs['sizes'] = (int(low), int(high))
+        elif name == 'malformed':
+            kwargs['malformed'] = float(value)
+        elif name == 'output':
+            kwargs['out'] = value
+        else:
+            raise ValueError('unknown option: {}'.format(arg))
+    return kwargs
+
+
+if __name__ == '__main__':
+    kwargs = parse_options(sys.argv[1:])
+    path = kwargs.pop('out', None)
+    if path is None:
+        generate(**kwargs)
+    else:
+        with open(path, 'w') as f:
+            generate(out=f, **kwargs)
@@ -4,34 +4,142 @@
 
 import sys
 
+log_stats = __import__('1-log_stats')
+
 cache = {'200': 0, '301': 0, '400': 0, '401': 0,
          '403': 0, '404': 0, '405': 0, '500': 0}
 total_size = 0
 counter = 0
 
-try:
-    for line in sys.stdin:
-        line_list = line.split(" ")
-        if len(line_list) > 4:
-            code = line_list[-2]
-            size = int(line_list[-1])
-            if code in cache.keys():
-                cache[code] += 1
-            total_size += size
-            counter += 1
-
-        if counter == 10:
-            counter = 0
-            print('File size: {}'.format(total_size))
-            for key, value in sorted(cache.items()):
-                if value != 0:
-                    print('{}: {}'.format(key, value))
-
-except Exception as err:
-    pass
-
-finally:
-    print('File size: {}'.format(total_size))
-    for key, value in sorted(cache.items()):
-        if value != 0:
-            print('{}: {}'.format(key, value))
+USAGE = ('Usage: 0-stats.py [--fast] [--every=N] [--interval=T] '
+         '[--windows[=S,...]] [--clients[=N]] [--jobs[=K]] [FILE...]')
+OPTIONS = ('every', 'interval', 'windows', 'clients', 'jobs', 'fast')
+
+
+def positive(value, kind):
+    '''returns value converted by kind if it is above 0 (and finite),
+    else None'''
+    try:
+        value = kind(value)
+    except ValueError:
+        return None
+    return value if 0 < value < float('inf') else None
+
+
+if __name__ == '__main__':
+    files = [arg for arg in sys.argv[1:] if not arg.startswith('--')]
+    options = dict(arg[2:].partition('=')[::2] for arg in sys.argv[1:]
+                   if arg.startswith('--'))
+
+    if (any(name not in OPTIONS for name in options) or
+            options.get('fast') or 'jobs' in options and not files):
+        sys.stderr.write(USAGE + '\n')
+        sys.exit(1)
+
+    if 'jobs' in options:
+        # split the files across a pool of processes, final report only;
+        # windows need the lines in order and client estimates can't be
+        # merged across processes, so they are not available here
+        jobs = None
+        if options['jobs']:
+            jobs = positive(options['jobs'], int)
+        if ('windows' in options or 'clients' in options or
+                options['jobs'] and jobs is None):
+            sys.stderr.write(USAGE + '\n')
+            sys.exit(1)
+        try:
+            stats, stopped = log_stats.ingest_files(files, jobs)
+        except OSError as err:
+            sys.stderr.write('{}\n'.format(err))
+            sys.exit(1)
+        sys.stdout.write(stats.report())
+        sys.exit(0)
+
+    if files or options:
+        # files are replayed through mmap, stdin is read in large binary
+        # chunks; a report every 10 lines unless --every=N lines and/or
+        # --interval=T seconds are given
+        every = interval = None
+        if 'every' in options:
+            every = positive(options['every'], int)
+        if 'interval' in options:
+            interval = positive(options['interval'], float)
+        if ('every' in options and every is None or
+                'interval' in options and interval is None):
+            sys.stderr.write(USAGE + '\n')
+            sys.exit(1)
+        if every is None and interval is None:
+            every = 10
+        aggregators = []
+        if 'windows' in options:
+            spans = [positive(span, float)
+                     for span in (options['windows'] or '1,60,300').split(',')]
+            if None in spans:
+                sys.stderr.write(USAGE + '\n')
+                sys.exit(1)
+            aggregators.append(log_stats.WindowedStats(spans))
+        if 'clients' in options:
+            shown = positive(options['clients'] or '5', int)
+            if shown is None:
+                sys.stderr.write(USAGE + '\n')
+                sys.exit(1)
+            aggregators.append(log_stats.ClientStats(shown=shown))
+        stats = log_stats.LogStats(aggregators)
+        timer = None
+        if interval:
+            timer = log_stats.ReportTimer(stats, sys.stdout, interval)
+            timer.start()
+        lock = timer.lock if timer else None
+        failed = None
+        try:
+            if files:
+                for path in files:
+                    log_stats.ingest_file(path, stats, sys.stdout, every,
+                                          aggregators=aggregators, lock=lock)
+            else:
+                log_stats.ingest(sys.stdin.buffer, stats, sys.stdout, every,
+                                 aggregators=aggregators, lock=lock)
+
+        except ValueError:
+            # a size that is not a number ends the input
+            pass
+
+        except OSError as err:
+            failed = err
+
+        finally:
+            if timer:
+                timer.stop()
+            if failed is None:
+                sys.stdout.write(stats.report())
+        if failed is not None:
+            sys.stderr.write('{}\n'.format(failed))
+            sys.exit(1)
+        sys.exit(0)
+
+    try:
+        for line in sys.stdin:
+            line_list = line.split(" ")
+            if len(line_list) > 4:
+                code = line_list[-2]
+                size = int(line_list[-1])
+                if code in cache.keys():
+                    cache[code] += 1
+                total_size += size
+                counter += 1
+
+            if counter == 10:
+                counter = 0
+                print('File size: {}'.format(total_size))
+                for key, value in sorted(cache.items()):
+                    if value != 0:
+                        print('{}: {}'.format(key, value))
+
+    except Exception as err:
+        pass
+
+    finally:
+        print('File size: {}'.format(total_size))
+        for key, value in sorted(cache.items()):
+            if value != 0:
+                print('{}: {}'.format(key, value))
@@ -0,0 +1,79 @@
+#!/usr/bin/python3
+'''Measures the throughput of 0-stats.py
+
+Usage: ./2-benchmark.py [--lines=N] [--seed=S] [--malformed=P]
+                        [--log=FILE] [--file] [-- 0-stats.py options...]
+
+Feeds a log file (by default N = 1000000 seeded lines from
+0-generator.py, in a temporary file) to 0-stats.py, throws its output
+away, and prints lines/sec, MB/s and the peak RSS of the 0-stats.py
+process. The log goes to 0-stats.py on stdin, or as a file argument
+with --file or when the 0-stats.py options include --jobs, which only
+works on files.
+'''
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+generator = __import__('0-generator')
+
+
+def benchmark(path, options=(), as_file=False):
+    '''runs 0-stats.py on the file at path (on stdin, or as an argument
+    if as_file) and returns its wall time in seconds and peak RSS in
+    KiB (the largest of all the children of this process waited for
+    so far)'''
+    command = [sys.executable, os.path.join(HERE, '0-stats.py')]
+    command.extend(options)
+    if as_file:
+        command.append(path)
+    with open(os.devnull if as_file else path, 'rb') as log, \
+            open(os.devnull, 'wb') as null:
+        start = time.time()
+        subprocess.call(command, stdin=log, stdout=null)
+        elapsed = time.time() - start
+    rss = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    if sys.platform == 'darwin':
+        rss //= 1024
+    return elapsed, rss
+
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    options = []
+    if '--' in args:
+        options = args[args.index('--') + 1:]
+        args = args[:args.index('--')]
+    settings = dict(arg[2:].partition('=')[::2] for arg in args)
+
+    path = settings.get('log')
+    if path is None:
+        fd, path = tempfile.mkstemp(suffix='.log')
+        with os.fdopen(fd, 'w') as f:
+            generator.generate(int(settings.get('lines', 1000000)), rate=0,
+                               seed=int(settings.get('seed', 0)),
+                               malformed=float(settings.get('malformed', 0)),
+                               out=f)
+    try:
+        with open(path, 'rb') as f:
+            lines = sum(block.count(b'\n')
+                        for block in iter(lambda: f.read(1 << 20), b''))
+        size = os.path.getsize(path)
+        as_file = 'file' in settings or any(
+            option.partition('=')[0] == '--jobs' for option in options)
+        elapsed, rss = benchmark(path, options, as_file)
+    finally:
+        if 'log' not in settings:
+            os.remove(path)
+
+    print('0-stats.py {}{}'.format(' '.join(options),
+                                   ' FILE' if as_file else '').strip())
+    print('lines: {} ({:.1f} MB) in {:.2f}s'.format(
+        lines, size / 1e6, elapsed))
+    print('lines/sec: {:.0f}'.format(lines / elapsed))
+    print('MB/s: {:.1f}'.format(size / 1e6 / elapsed))
+    print('peak RSS: {:.1f} MB'.format(rss / 1024))
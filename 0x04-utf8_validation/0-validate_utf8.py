@@ -2,30 +2,519 @@
 """
     Determines if a given data set represents a valid UTF-8 encoding
 """
+import mmap
+import os
+import re
+import sys
+from array import array
+from multiprocessing import Pool, shared_memory
 
+# a run of characters of the shapes validUTF8 accepts
+_LENIENT = re.compile(
+    rb'(?:[\x00-\x7f]+|[\xc0-\xdf][\x80-\xbf]|[\xe0-\xef][\x80-\xbf]{2}'
+    rb'|[\xf0-\xf7][\x80-\xbf]{3})*')
 
-def validUTF8(data):
+
+def _transitions(strict):
+    """
+    Returns the transition table of a DFA over bytes: the next state
+    is table[state + byte], states being multiples of 256
+
+    State 0 is between characters and 256 rejects (it never leaves),
+    the others wait for continuation bytes. With strict, only the
+    shortest form of each code point up to U+10FFFF, surrogates
+    excepted, is accepted; else every sequence with the right bit
+    prefixes is, like validUTF8 always did.
+    """
+    reject = 256
+    table = [reject] * (9 * 256)
+    for byte in range(0x80):
+        table[byte] = 0
+    # waiting for 1, 2 or 3 continuation bytes (states 512 to 1024),
+    # or for the first of them within a narrower range (1280 to 2048)
+    for byte in range(0x80, 0xC0):
+        table[512 + byte] = 0
+        table[768 + byte] = 512
+        table[1024 + byte] = 768
+    for state, low, high, then in ((1280, 0xA0, 0xBF, 512),
+                                   (1536, 0x80, 0x9F, 512),
+                                   (1792, 0x90, 0xBF, 768),
+                                   (2048, 0x80, 0x8F, 768)):
+        for byte in range(low, high + 1):
+            table[state + byte] = then
+
+    if not strict:
+        table[0xC0:0xE0] = [512] * 0x20
+        table[0xE0:0xF0] = [768] * 0x10
+        table[0xF0:0xF8] = [1024] * 8
+        return table
+    table[0xC2:0xE0] = [512] * 0x1E
+    table[0xE1:0xF0] = [768] * 0x0F
+    table[0xE0] = 1280
+    table[0xED] = 1536
+    table[0xF1:0xF4] = [1024] * 3
+    table[0xF0] = 1792
+    table[0xF4] = 2048
+    return table
+
+
+_TABLES = (_transitions(False), _transitions(True))
+_UTF32 = 'utf-32-le' if sys.byteorder == 'little' else 'utf-32-be'
+# bytes the decoder rejects, as its surrogateescape handler writes them
+_ESCAPED = re.compile('[\udc80-\udcff]+')
+
+
+def validUTF8(data, strict=False):
     """
     Determines if a given data set represents a valid UTF-8 encoding
+
+    Every integer must be a byte (0 to 255). By default a character is
+    any sequence with the right bit prefixes; with strict, overlong
+    forms, surrogates and code points past U+10FFFF are rejected too.
+    Each byte costs a single lookup in the table of a DFA.
     """
-    num_bytes = 0
+    try:
+        data = bytes(data)
+    except ValueError:
+        return False
 
+    table = _TABLES[strict]
+    state = 0
     for byte in data:
-        # Check if the byte represents a continuation byte
-        if num_bytes == 0:
-            if byte >> 3 == 0b11110:
-                num_bytes = 3
-            elif byte >> 4 == 0b1110:
-                num_bytes = 2
-            elif byte >> 5 == 0b110:
-                num_bytes = 1
-            elif byte >> 7 == 0:
-                num_bytes = 0
-            else:
+        state = table[state + byte]
+    return state == 0
+
+
+def split_points(buf, block_size):
+    """
+    Returns the offsets cutting buf into blocks of about block_size
+    bytes, each cut moved forward past any continuation byte
+    (0b10xxxxxx) so that no character is cut in half
+    """
+    points = [0]
+    n = len(buf)
+    cut = block_size
+    while cut < n:
+        while cut < n and buf[cut] & 0xC0 == 0x80:
+            cut += 1
+        if cut < n:
+            points.append(cut)
+        cut += block_size
+    points.append(n)
+    return points
+
+
+def _first_error(block, strict=False):
+    """
+    Returns the offset in a bytes-like block of the first sequence
+    validUTF8 rejects, or None if there is none
+
+    The built-in decoder checks the block at C speed (with a fast
+    path for ASCII), and it is strict. Where it stops, on something
+    the lenient rules may still accept (an overlong form, a surrogate,
+    a code point past U+10FFFF), the rest of the block is matched
+    against the bit prefixes validUTF8 checks.
+    """
+    try:
+        str(block, 'utf-8')
+        return None
+    except UnicodeDecodeError as err:
+        if strict:
+            return err.start
+        end = _LENIENT.match(block, err.start).end()
+        return end if end < len(block) else None
+
+
+def _valid_numpy(np, a, block_size):
+    """
+    Same as validUTF8 on a NumPy array, with vectorized masks
+    """
+    if a.dtype != np.uint8:
+        if a.size and (a.min() < 0 or a.max() > 255):
+            return False
+        a = a.astype(np.uint8)
+    a = a.ravel()
+
+    # skip the leading ASCII blocks
+    start = 0
+    while start < len(a) and a[start:start + block_size].max() < 0x80:
+        start += block_size
+    a = a[start:]
+    n = len(a)
+    if n == 0:
+        return True
+    if (a >= 0xF8).any():
+        return False
+
+    cont = (a & 0xC0) == 0x80
+    # continuation bytes each lead byte needs: 110xxxxx 1, 1110xxxx 2,
+    # 11110xxx 3
+    need = ((a >= 0xC0).astype(np.int8) + (a >= 0xE0) + (a >= 0xF0))
+    tail = np.arange(max(0, n - 3), n)
+    if (need[tail] > n - 1 - tail).any():
+        return False
+    expected = np.zeros(n, dtype=bool)
+    for k in range(1, min(3, n - 1) + 1):
+        expected[k:] |= need[:-k] >= k
+    return bool(np.array_equal(expected, cont))
+
+
+def validUTF8_fast(data, block_size=1 << 20, strict=False):
+    """
+    Same as validUTF8, for bytes, bytearray, memoryview or NumPy
+    arrays (lists and other iterables go to validUTF8)
+
+    Bytes-like data is cut into blocks at character boundaries and
+    each one is decoded by the built-in codec, which exits early over
+    pure ASCII. NumPy arrays are classified into lead and continuation
+    bytes with vectorized masks, and the continuation runs each lead
+    byte needs are checked in bulk; with strict they are checked as
+    bytes instead.
+    """
+    if type(data).__module__ == 'numpy':
+        import numpy as np
+        data = np.asarray(data)
+        if not strict:
+            return _valid_numpy(np, data, block_size)
+        if data.size and (data.min() < 0 or data.max() > 255):
+            return False
+        data = np.ascontiguousarray(data.ravel(), dtype=np.uint8)
+    elif not isinstance(data, (bytes, bytearray, memoryview)):
+        return validUTF8(data, strict)
+
+    buf = memoryview(data).cast('B')
+    points = split_points(buf, block_size)
+    return all(_first_error(buf[start:end], strict) is None
+               for start, end in zip(points, points[1:]))
+
+
+def _sequence_length(lead):
+    """
+    Returns the length of the sequence lead starts for validUTF8, or
+    0 if lead can't start one
+    """
+    if lead < 0x80:
+        return 1
+    if 0xC0 <= lead < 0xE0:
+        return 2
+    if 0xE0 <= lead < 0xF0:
+        return 3
+    if 0xF0 <= lead < 0xF8:
+        return 4
+    return 0
+
+
+class UTF8Validator:
+    """
+    Validates data that arrives in chunks, with the rules of validUTF8
+
+    feed(chunk) checks one chunk at a time; a character cut by the end
+    of a chunk is kept (at most 3 bytes) until the next one completes
+    it, so memory does not grow with the stream. finish() says whether
+    the whole stream was valid. After the first invalid sequence the
+    validator stops checking, and error holds the offset of its first
+    byte in the stream. With strict, the rules are those of
+    validUTF8(data, strict=True).
+    """
+
+    def __init__(self, block_size=1 << 20, strict=False):
+        """creates a validator for a new stream"""
+        self.block_size = block_size
+        self.strict = strict
+        self.offset = 0
+        self.error = None
+        self._tail = b''
+
+    def feed(self, chunk):
+        """
+        Checks the next chunk of the stream: bytes-like data, or a
+        list of integers like validUTF8 takes; returns False once the
+        stream is known to be invalid
+        """
+        if self.error is not None:
+            return False
+        if not isinstance(chunk, (bytes, bytearray, memoryview)):
+            chunk = list(chunk)
+            bad = next((i for i, byte in enumerate(chunk)
+                        if not 0 <= byte <= 255), None)
+            if bad is not None:
+                if self.feed(bytes(chunk[:bad])):
+                    # the bad value, or the character it cuts short
+                    self.error = self.offset
                 return False
-        else:
-            if byte >> 6 != 0b10:
+            chunk = bytes(chunk)
+
+        buf = memoryview(chunk).cast('B')
+        if self._tail:
+            missing = _sequence_length(self._tail[0]) - len(self._tail)
+            head = self._tail + bytes(buf[:missing])
+            if len(head) < missing + len(self._tail):
+                if any(byte & 0xC0 != 0x80 for byte in head[1:]):
+                    self.error = self.offset
+                    return False
+                self._tail = head
+                return True
+            if _first_error(head, self.strict) is not None:
+                self.error = self.offset
                 return False
-            num_bytes -= 1
+            self.offset += len(head)
+            self._tail = b''
+            buf = buf[missing:]
 
-    return num_bytes == 0
+        # keep a character cut by the end of the chunk for the next one
+        end = len(buf)
+        for i in range(end - 1, max(end - 4, -1), -1):
+            if buf[i] & 0xC0 != 0x80:
+                if end - i < _sequence_length(buf[i]):
+                    end = i
+                break
+
+        points = split_points(buf[:end], self.block_size)
+        for start, stop in zip(points, points[1:]):
+            bad = _first_error(buf[start:stop], self.strict)
+            if bad is not None:
+                self.error = self.offset + start + bad
+                return False
+        self.offset += end
+        self._tail = bytes(buf[end:])
+        return True
+
+    def finish(self):
+        """
+        Ends the stream; returns True if all of it was valid, else
+        False with error set
+        """
+        if self.error is None and self._tail:
+            self.error = self.offset
+        return self.error is None
+
+
+def _lenient_points(run):
+    """
+    Returns the code points of bytes made of whole characters of the
+    shapes validUTF8 accepts, or None if they are not
+    """
+    points = []
+    i = 0
+    while i < len(run):
+        length = _sequence_length(run[i])
+        char = run[i:i + length]
+        if length == 0 or len(char) < length or any(
+                byte & 0xC0 != 0x80 for byte in char[1:]):
+            return None
+        point = char[0] & (0x7F >> length if length > 1 else 0x7F)
+        for byte in char[1:]:
+            point = point << 6 | byte & 0x3F
+        points.append(point)
+        i += length
+    return points
+
+
+def _decode_block(block, strict, raw, pos):
+    """
+    Validates a bytes-like block cut at character boundaries and
+    writes its code points, 4 bytes each, into raw (a byte view of an
+    array('I')) from item pos, unless raw is None; returns the item
+    after the last one written, or None if the block is invalid
+
+    The built-in decoder validates and decodes in the same C pass.
+    If it fails in lenient mode, the block is decoded again escaping
+    the bytes it rejects (as U+DC80 to U+DCFF), and only those runs
+    are decoded here.
+    """
+    try:
+        text = str(block, 'utf-8')
+    except UnicodeDecodeError:
+        if strict:
+            return None
+        text = str(block, 'utf-8', 'surrogateescape')
+    else:
+        if raw is not None:
+            raw[4 * pos:4 * (pos + len(text))] = text.encode(_UTF32)
+        return pos + len(text)
+
+    start = 0
+    for run in _ESCAPED.finditer(text):
+        points = _lenient_points(bytes(ord(c) - 0xDC00
+                                       for c in run.group()))
+        if points is None:
+            return None
+        if raw is not None:
+            part = text[start:run.start()].encode(_UTF32)
+            part += array('I', points).tobytes()
+            raw[4 * pos:4 * pos + len(part)] = part
+        pos += run.start() - start + len(points)
+        start = run.end()
+    if raw is not None:
+        raw[4 * pos:4 * (pos + len(text) - start)] = \
+            text[start:].encode(_UTF32)
+    return pos + len(text) - start
+
+
+def _decode(data, strict, out, block_size):
+    """
+    Runs _decode_block over data block by block; returns the number of
+    characters, or None if data is invalid
+    """
+    if not isinstance(data, (bytes, bytearray, memoryview)):
+        try:
+            data = bytes(iter(data))
+        except ValueError:
+            return None
+    buf = memoryview(data).cast('B')
+    points = split_points(buf, block_size)
+
+    raw = None
+    if out is not None:
+        # every character takes at least one byte
+        if len(out) < len(buf):
+            out.frombytes(bytes(out.itemsize * (len(buf) - len(out))))
+        raw = memoryview(out).cast('B')
+    try:
+        pos = 0
+        for start, end in zip(points, points[1:]):
+            pos = _decode_block(buf[start:end], strict, raw, pos)
+            if pos is None:
+                return None
+        return pos
+    finally:
+        if raw is not None:
+            raw.release()
+
+
+def decodeUTF8(data, strict=False, out=None, block_size=1 << 20):
+    """
+    Validates data like validUTF8 and decodes it to code points in
+    the same pass; returns them as an array('I'), or None if data is
+    not valid
+
+    The code points are written into a preallocated array, out if
+    given (it is grown to len(data) items, the most data can decode
+    to, then cut down to the number of characters), else a new one.
+    """
+    if out is None:
+        out = array('I')
+    count = _decode(data, strict, out, block_size)
+    if count is None:
+        return None
+    del out[count:]
+    return out
+
+
+def countUTF8(data, strict=False, block_size=1 << 20):
+    """
+    Validates data like validUTF8 and counts its characters in the
+    same pass; returns the count, or None if data is not valid
+    """
+    return _decode(data, strict, None, block_size)
+
+
+def _check_range(task):
+    """
+    pool worker: returns the offset of the first error in a range of
+    a file or of a shared memory block, or None if there is none
+    """
+    kind, name, start, end, block_size, strict = task
+    if kind == 'file':
+        with open(name, 'rb') as f:
+            source = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        buf = memoryview(source)
+    else:
+        source = shared_memory.SharedMemory(name)
+        buf = source.buf
+    try:
+        chunk = buf[start:end]
+        try:
+            points = split_points(chunk, block_size)
+            for first, last in zip(points, points[1:]):
+                block = chunk[first:last]
+                bad = _first_error(block, strict)
+                block.release()
+                if bad is not None:
+                    return start + first + bad
+            return None
+        finally:
+            chunk.release()
+    finally:
+        buf.release()
+        source.close()
+
+
+def first_error_parallel(data, processes=None, parts=None, strict=False,
+                         block_size=1 << 20):
+    """
+    Returns the offset of the first sequence validUTF8 rejects in
+    data, or None if data is valid, checking pieces of it on a pool
+    of processes
+
+    data is the path of a file, which every process maps on its own,
+    a SharedMemory block, or bytes-like data, copied once into a
+    SharedMemory block. It is cut into `parts` chunks (4 per process
+    by default) with split_points, so each chunk starts on a character
+    and can be checked alone; the offsets come back in chunk order
+    and the first one found is the first error of the whole data.
+    """
+    if processes is None:
+        processes = os.cpu_count() or 1
+    if parts is None:
+        parts = 4 * processes
+
+    shm = owned = None
+    if isinstance(data, str):
+        kind, name, size = 'file', data, os.path.getsize(data)
+        if size == 0:
+            return None
+        with open(data, 'rb') as f:
+            source = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        buf = memoryview(source)
+    else:
+        if isinstance(data, shared_memory.SharedMemory):
+            shm = data
+        else:
+            if not isinstance(data, (bytes, bytearray, memoryview)):
+                try:
+                    data = bytes(iter(data))
+                except ValueError:
+                    validator = UTF8Validator(strict=strict)
+                    validator.feed(data)
+                    validator.finish()
+                    return validator.error
+            data = memoryview(data).cast('B')
+            if len(data) == 0:
+                return None
+            shm = owned = shared_memory.SharedMemory(create=True,
+                                                     size=len(data))
+            shm.buf[:len(data)] = data
+            size = len(data)
+        kind, name, source = 'shm', shm.name, None
+        if owned is None:
+            size = shm.size
+        buf = shm.buf
+
+    try:
+        points = split_points(buf[:size], -(-size // parts))
+    finally:
+        if source is not None:
+            buf.release()
+            source.close()
+    tasks = [(kind, name, start, end, block_size, strict)
+             for start, end in zip(points, points[1:])]
+
+    try:
+        with Pool(min(processes, len(tasks))) as pool:
+            for bad in pool.imap(_check_range, tasks):
+                if bad is not None:
+                    return bad
+        return None
+    finally:
+        if owned is not None:
+            owned.close()
+            owned.unlink()
+
+
+def validUTF8_parallel(data, processes=None, parts=None, strict=False):
+    """
+    Same as validUTF8, checked on a pool of processes; data is a path,
+    a SharedMemory block or bytes-like data (see first_error_parallel)
+    """
+    return first_error_parallel(data, processes, parts, strict) is None
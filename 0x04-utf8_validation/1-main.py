@@ -0,0 +1,71 @@
+#!/usr/bin/python3
+"""
+1-main: checks validUTF8_fast against validUTF8 on the 0-main.py
+cases and on random data (as bytes, bytearray, memoryview and, when
+NumPy is installed, NumPy arrays), in both modes
+"""
+import random
+
+utf8 = __import__('0-validate_utf8')
+validUTF8 = utf8.validUTF8
+validUTF8_fast = utf8.validUTF8_fast
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# characters of every length, and sequences only the lenient mode takes
+PIECES = [b'a', b'\xc3\xa9', b'\xe2\x9c\x93', b'\xf0\x9d\x84\x9e',
+          b'\xc0\x80', b'\xe0\x80\x80', b'\xed\xa0\x80', b'\xf4\x90\x80\x80',
+          b'\xf7\xbf\xbf\xbf']
+
+
+def sample(rand):
+    """returns random bytes, or a random mix of PIECES with at most
+    one byte changed"""
+    if rand.random() < 0.4:
+        return bytes(rand.randrange(256) for _ in range(rand.randrange(16)))
+    data = b''.join(rand.choice(PIECES) for _ in range(rand.randrange(12)))
+    if data and rand.random() < 0.5:
+        i = rand.randrange(len(data))
+        data = data[:i] + bytes([rand.randrange(256)]) + data[i + 1:]
+    return data
+
+
+def variants(data):
+    """returns data as every kind of input validUTF8_fast takes"""
+    found = [data, bytearray(data), memoryview(data)]
+    if np is not None:
+        found.append(np.frombuffer(data, dtype=np.uint8))
+        found.append(np.array(list(data), dtype=np.int64))
+    return found
+
+
+if __name__ == "__main__":
+    cases = [[65],
+             [80, 121, 116, 104, 111, 110, 32, 105, 115, 32, 99, 111, 111,
+              108, 33],
+             [229, 65, 127, 256]]
+    for data in cases:
+        found = [validUTF8_fast(data)]
+        if np is not None:
+            found.append(validUTF8_fast(np.array(data)))
+        want = validUTF8(data)
+        print("{}: {}".format(want, "OK" if set(found) == {want} else
+                              "validUTF8_fast gives {}".format(found)))
+
+    rand = random.Random(0)
+    wrong = 0
+    tries = 5000
+    for _ in range(tries):
+        data = sample(rand)
+        for strict in (False, True):
+            want = validUTF8(list(data), strict)
+            for block_size in (1, 3, 1 << 20):
+                for given in variants(data):
+                    if validUTF8_fast(given, block_size, strict) != want:
+                        wrong += 1
+    print("{} random inputs{}: {}".format(
+        tries, "" if np is not None else " (no NumPy)",
+        "OK" if not wrong else "{} differences".format(wrong)))
@@ -3,14 +3,50 @@
 
 import sys
 
+solver = __import__('1-nqueens_solver')
+
+
+def parse_options(argv):
+    """splits argv into the N argument and a dict of --options,
+    returns None if the command line is not valid"""
+    options = {}
+    args = []
+    for arg in argv:
+        if not arg.startswith('--'):
+            args.append(arg)
+            continue
+        name, _, value = arg[2:].partition('=')
+        if name in ('count', 'distinct', 'resume') and not value:
+            options[name] = True
+        elif name == 'checkpoint' and value:
+            options[name] = value
+        elif name == 'jobs':
+            try:
+                options[name] = int(value) if value else None
+            except ValueError:
+                return None
+            if value and options[name] < 1:
+                return None
+        else:
+            return None
+    if len(args) != 1:
+        return None
+    if 'checkpoint' in options and 'jobs' in options:
+        return None
+    if 'resume' in options and 'checkpoint' not in options:
+        return None
+    return args[0], options
+
 
 if __name__ == '__main__':
-    if len(sys.argv) != 2:
+    parsed = parse_options(sys.argv[1:])
+    if parsed is None:
         print("Usage: nqueens N")
         sys.exit(1)
+    arg, options = parsed
 
     try:
-        n = int(sys.argv[1])
+        n = int(arg)
     except ValueError:
         print('N must be a number')
         exit(1)
@@ -19,73 +55,43 @@ if __name__ == '__main__':
         print('N must be at least 4')
         exit(1)
 
-    solutions = []
-    placed_queens = []  # coordinates format [row, column]
-    stop = False
-    r = 0
-    c = 0
+    if 'checkpoint' in options:
+        mode = 'solve'
+        if options.get('count') and options.get('distinct'):
+            mode = 'count_distinct'
+        elif options.get('distinct'):
+            mode = 'distinct'
+        elif options.get('count'):
+            mode = 'count'
+        try:
+            found = solver.run_checkpointed(n, options['checkpoint'], mode,
+                                            options.get('resume', False))
+        except ValueError as err:
+            print(err)
+            exit(1)
+        if options.get('count'):
+            print(found)
+        sys.exit(0)
 
-    # iterate thru rows
-    while r < n:
-        goback = False
-        # iterate thru columns
-        while c < n:
-            # check is current column is safe
-            safe = True
-            for cord in placed_queens:
-                col = cord[1]
-                if(col == c or col + (r-cord[0]) == c or
-                        col - (r-cord[0]) == c):
-                    safe = False
-                    break
+    parallel = 'jobs' in options
+    jobs = options.get('jobs')
 
-            if not safe:
-                if c == n - 1:
-                    goback = True
-                    break
-                c += 1
-                continue
-
-            # place queen
-            cords = [r, c]
-            placed_queens.append(cords)
-            # if last row, append solution and reset all to last unfinished row
-            # and last safe column in that row
-            if r == n - 1:
-                solutions.append(placed_queens[:])
-                for cord in placed_queens:
-                    if cord[1] < n - 1:
-                        r = cord[0]
-                        c = cord[1]
-                for i in range(n - r):
-                    placed_queens.pop()
-                if r == n - 1 and c == n - 1:
-                    placed_queens = []
-                    stop = True
-                r -= 1
-                c += 1
+    if options.get('count'):
+        if options.get('distinct'):
+            if parallel:
+                print(solver.count_distinct_parallel(n, jobs))
             else:
-                c = 0
-            break
-        if stop:
-            break
-        # on fail: go back to previous row
-        # and continue from last safe column + 1
-        if goback:
-            r -= 1
-            while r >= 0:
-                c = placed_queens[r][1] + 1
-                del placed_queens[r]  # delete previous queen coordinates
-                if c < n:
-                    break
-                r -= 1
-            if r < 0:
-                break
-            continue
-        r += 1
-
-    for idx, val in enumerate(solutions):
-        if idx == len(solutions) - 1:
-            print(val, end='')
+                print(solver.count_distinct(n))
+        elif parallel:
+            print(solver.count_parallel(n, jobs))
         else:
-            print(val)
+            print(solver.count(n))
+        sys.exit(0)
+
+    if parallel:
+        solutions = solver.iter_solutions_parallel(
+            n, jobs, distinct=options.get('distinct'))
+    else:
+        solutions = solver.iter_solutions(n, distinct=options.get('distinct'))
+
+    solver.write_solutions(solutions)
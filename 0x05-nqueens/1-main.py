@@ -0,0 +1,18 @@
+#!/usr/bin/python3
+"""
+1-main
+"""
+solver = __import__('1-nqueens_solver')
+
+if __name__ == "__main__":
+    # number of solutions for n = 1..12 (OEIS A000170)
+    expected = [1, 0, 0, 2, 10, 4, 40, 92, 352, 724, 2680, 14200]
+    # number of distinct solutions for n = 1..12 (OEIS A002562)
+    unique = [1, 0, 0, 1, 2, 1, 6, 12, 46, 92, 341, 1787]
+    for n in range(1, len(expected) + 1):
+        found = (len(solver.solve(n)), solver.count(n),
+                 len(solver.distinct(n)), solver.count_distinct(n))
+        want = (expected[n - 1], expected[n - 1], unique[n - 1],
+                unique[n - 1])
+        print("{}: {} ({})".format(n, found, "OK" if found == want else
+                                   "expected {}".format(want)))
@@ -0,0 +1,421 @@
+#!/usr/bin/python3
+"""N-Queens bitboard solver engine"""
+
+import os
+import sys
+import time
+from multiprocessing import Pool
+
+
+def _place(n, prefix):
+    """returns the (cols, left, right) attack masks of the queens in
+    prefix, one column per row, or None if two of them attack each other
+
+    Columns and both diagonals are tracked as integer bitmasks, bit c
+    standing for column c, so checking a square is a single AND."""
+    full = (1 << n) - 1
+    cols = left = right = 0
+    for c in prefix:
+        bit = 1 << c
+        if (cols | left | right) & bit:
+            return None
+        cols |= bit
+        left = ((left | bit) << 1) & full
+        right = (right | bit) >> 1
+    return cols, left, right
+
+
+def _walk(n, prefix=(), first=None, frontier=None):
+    """yields the column of the queen in each row for every solution
+    starting with the queens in prefix, and whose next queen sits in
+    one of the columns set in the first mask
+
+    The same list is yielded every time, copy it to keep it.
+    If frontier is an empty list, it receives the live (queens, avail)
+    lists of the search; whenever a solution is yielded, they hold all
+    that is needed to resume right after it by passing them back in
+    frontier (with the same prefix)."""
+    masks = _place(n, prefix)
+    if masks is None:
+        return
+    base = len(prefix)
+    queens = list(prefix) + [0] * (n - base)
+    if base == n:
+        yield queens
+        return
+
+    full = (1 << n) - 1
+    cols = [0] * n
+    left = [0] * n
+    right = [0] * n
+    avail = [0] * n
+    if frontier:
+        queens, avail = frontier
+        for r in range(base, n):
+            cols[r], left[r], right[r] = _place(n, queens[:r])
+        row = n - 1
+    else:
+        cols[base], left[base], right[base] = masks
+        avail[base] = full & ~(masks[0] | masks[1] | masks[2])
+        if first is not None:
+            avail[base] &= first
+        row = base
+        if frontier is not None:
+            frontier[:] = [queens, avail]
+
+    while row >= base:
+        free = avail[row]
+        if not free:
+            row -= 1
+            continue
+        bit = free & -free
+        avail[row] = free ^ bit
+        queens[row] = bit.bit_length() - 1
+
+        if row == n - 1:
+            yield queens
+            continue
+
+        c = cols[row] | bit
+        lft = ((left[row] | bit) << 1) & full
+        rgt = (right[row] | bit) >> 1
+        row += 1
+        cols[row] = c
+        left[row] = lft
+        right[row] = rgt
+        avail[row] = full & ~(c | lft | rgt)
+
+
+def _count(n, cols, left, right):
+    """returns the number of ways to complete a board from the attack
+    masks of the queens already placed on its first rows"""
+    full = (1 << n) - 1
+
+    def complete(cols, left, right):
+        if cols == full:
+            return 1
+        total = 0
+        free = full & ~(cols | left | right)
+        while free:
+            bit = free & -free
+            free ^= bit
+            total += complete(cols | bit, ((left | bit) << 1) & full,
+                              (right | bit) >> 1)
+        return total
+
+    return complete(cols, left, right)
+
+
+def _symmetries(n, queens):
+    """returns the 8 images of a solution under the rotations and
+    reflections of the board, as column tuples"""
+    last = n - 1
+    inverse = [0] * n
+    for r, c in enumerate(queens):
+        inverse[c] = r
+    images = []
+    for q in (queens, inverse):
+        images.append(tuple(q))
+        images.append(tuple(last - c for c in q))
+        images.append(tuple(reversed(q)))
+        images.append(tuple(last - c for c in reversed(q)))
+    return images
+
+
+def _is_smallest(n, queens):
+    """tells if the solution in queens, a column list, is the smallest
+    of its images, i.e. the one distinct(n) keeps"""
+    return tuple(queens) == min(_symmetries(n, queens))
+
+
+def _solutions(n, prefix=(), first=None, distinct=False, frontier=None):
+    """yields the solutions found by _walk as [row, column] lists,
+    keeping only the smallest image of each one if distinct is set"""
+    for queens in _walk(n, prefix, first, frontier):
+        if distinct and not _is_smallest(n, queens):
+            continue
+        yield [[r, c] for r, c in enumerate(queens)]
+
+
+def iter_solutions(n, distinct=False):
+    """yields the solutions of solve(n) (or distinct(n)) one at a time,
+    as soon as they are found
+
+    Only the current placement is kept in memory."""
+    if n <= 0:
+        return iter(())
+    if distinct:
+        return _solutions(n, first=(1 << ((n + 1) // 2)) - 1,
+                          distinct=True)
+    return _solutions(n)
+
+
+def solve(n):
+    """returns every solution to the n queens puzzle as a list of
+    [row, column] coordinate lists, in row-major order"""
+    return list(iter_solutions(n))
+
+
+def count(n):
+    """returns the number of solutions to the n queens puzzle
+
+    Only the left half of row 0 is searched and the result doubled,
+    since mirroring a solution left to right gives another one.
+    With n odd, the middle column of row 0 is handled the same way
+    on row 1. No solution is ever materialized."""
+    if n <= 0:
+        return 0
+    if n == 1:
+        return 1
+
+    full = (1 << n) - 1
+    half = n // 2
+    total = 0
+    for c in range(half):
+        bit = 1 << c
+        total += _count(n, bit, (bit << 1) & full, bit >> 1)
+
+    if n % 2:
+        bit = 1 << half
+        cols, left, right = bit, (bit << 1) & full, bit >> 1
+        for c in range(half):
+            nbit = 1 << c
+            if (cols | left | right) & nbit:
+                continue
+            total += _count(n, cols | nbit, ((left | nbit) << 1) & full,
+                            (right | nbit) >> 1)
+
+    return total * 2
+
+
+def distinct(n):
+    """returns one solution per class of solutions equivalent under
+    rotation and reflection, in row-major order
+
+    The representative of a class is its smallest image in row-major
+    order, whose row 0 queen is always in the left half (or middle)
+    of the board, so only that part of the tree is searched."""
+    return list(iter_solutions(n, distinct=True))
+
+
+def count_distinct(n):
+    """returns len(distinct(n)), checking each solution of the left
+    half of the board on the column list the search works on, without
+    building its [row, column] pairs"""
+    if n <= 0:
+        return 0
+    return sum(1 for queens in _walk(n, first=(1 << ((n + 1) // 2)) - 1)
+               if _is_smallest(n, queens))
+
+
+def _prefixes(n, depth, first):
+    """returns every conflict-free placement of the queens of the first
+    depth rows, with the row 0 queen in one of the columns set in the
+    first mask, in row-major order"""
+    full = (1 << n) - 1
+    prefixes = [()]
+    for row in range(min(depth, n)):
+        grown = []
+        for prefix in prefixes:
+            cols, left, right = _place(n, prefix)
+            free = full & ~(cols | left | right)
+            if row == 0:
+                free &= first
+            for c in range(n):
+                if free >> c & 1:
+                    grown.append(prefix + (c,))
+        prefixes = grown
+    return prefixes
+
+
+def _subtree(task):
+    """pool worker: returns the solutions (or their number) of the
+    subtree under the placement in task"""
+    mode, n, prefix = task
+    if mode == 'count':
+        return _count(n, *_place(n, prefix))
+    if mode == 'count_distinct':
+        return sum(1 for queens in _walk(n, prefix)
+                   if _is_smallest(n, queens))
+    return list(_solutions(n, prefix, distinct=(mode == 'distinct')))
+
+
+def iter_solutions_parallel(n, processes=None, depth=2, distinct=False):
+    """yields the solutions of solve(n) (or distinct(n)), with the
+    search tree split by the columns of the first depth queens and
+    the subtrees run on a pool of processes
+
+    Subtrees are handed out and merged back in row-major order, each
+    one being yielded as soon as it and all those before it are done."""
+    if n <= 0:
+        return
+    mode = 'solve'
+    first = (1 << n) - 1
+    if distinct:
+        mode = 'distinct'
+        first = (1 << ((n + 1) // 2)) - 1
+
+    tasks = [(mode, n, prefix) for prefix in _prefixes(n, depth, first)]
+    with Pool(processes) as pool:
+        for part in pool.imap(_subtree, tasks):
+            for solution in part:
+                yield solution
+
+
+def solve_parallel(n, processes=None, depth=2, distinct=False):
+    """returns the same list as solve(n) (or distinct(n)), computed by
+    iter_solutions_parallel"""
+    return list(iter_solutions_parallel(n, processes, depth, distinct))
+
+
+def count_parallel(n, processes=None, depth=2):
+    """returns count(n), with the left half of the search tree split
+    by the columns of the first depth queens and the subtrees counted
+    on a pool of processes
+
+    depth is raised to 1 (2 for an odd n), the rows needed to tell the
+    left half from its mirror."""
+    if n <= 0:
+        return 0
+    if n == 1:
+        return 1
+
+    half = n // 2
+    depth = max(depth, 2 if n % 2 else 1)
+    tasks = [('count', n, prefix)
+             for prefix in _prefixes(n, depth, (1 << ((n + 1) // 2)) - 1)
+             if prefix[0] < half or prefix[1] < half]
+    with Pool(processes) as pool:
+        return 2 * sum(pool.imap_unordered(_subtree, tasks))
+
+
+def count_distinct_parallel(n, processes=None, depth=2):
+    """returns count_distinct(n), with the subtrees under the first
+    depth queens counted on a pool of processes"""
+    if n <= 0:
+        return 0
+    tasks = [('count_distinct', n, prefix)
+             for prefix in _prefixes(n, depth, (1 << ((n + 1) // 2)) - 1)]
+    with Pool(processes) as pool:
+        return sum(pool.imap_unordered(_subtree, tasks))
+
+
+def write_solutions(solutions, stream=None, batch=4096, written=0,
+                    flushed=None):
+    """writes solutions to stream (stdout by default) the way print
+    shows them, one per line with no newline after the last one, and
+    returns how many were written in total
+
+    Lines are joined and written in batches, starting with a batch of
+    one so the first solution shows up right away, then doubling up
+    to batch lines per write. written is the number of lines already
+    on the stream, and flushed(written) is called after each write."""
+    if stream is None:
+        stream = sys.stdout
+    limit = 1
+    buffer = []
+    for solution in solutions:
+        buffer.append(str(solution))
+        if len(buffer) >= limit:
+            stream.write(('\n' if written else '') + '\n'.join(buffer))
+            stream.flush()
+            written += len(buffer)
+            buffer = []
+            limit = min(limit * 2, batch)
+            if flushed is not None:
+                flushed(written)
+    if buffer:
+        stream.write(('\n' if written else '') + '\n'.join(buffer))
+        stream.flush()
+        written += len(buffer)
+        if flushed is not None:
+            flushed(written)
+    return written
+
+
+def save_checkpoint(path, mode, n, found, frontier):
+    """saves the frontier of a serial search, and the number of
+    solutions found so far, to path
+
+    The file is written next to path then renamed over it, so a search
+    killed while saving still leaves the previous checkpoint intact."""
+    queens, avail = frontier
+    tmp = path + '.tmp'
+    with open(tmp, 'w') as f:
+        f.write('{} {} {}\n{}\n{}\n'.format(
+            mode, n, found,
+            ' '.join(str(c) for c in queens),
+            ' '.join(str(a) for a in avail)))
+    os.replace(tmp, path)
+
+
+def load_checkpoint(path):
+    """returns the (mode, n, found, frontier) saved in path by
+    save_checkpoint"""
+    with open(path) as f:
+        head, queens, avail = f.read().split('\n')[:3]
+    mode, n, found = head.split()
+    return (mode, int(n), int(found),
+            [[int(c) for c in queens.split()],
+             [int(a) for a in avail.split()]])
+
+
+def run_checkpointed(n, path, mode='solve', resume=False, interval=60,
+                     stream=None):
+    """runs a serial search, saving its frontier to path at most every
+    interval seconds, and returns the number of solutions
+
+    mode is 'solve' or 'distinct' to write the solutions to stream as
+    0-nqueens.py does, or 'count' or 'count_distinct' to only count
+    them. With resume, the search continues from the checkpoint in path
+    if there is one, and writes the solutions found after it, so the
+    ones written between that checkpoint and the interruption come out
+    again. The checkpoint is removed once the search is over."""
+    if n <= 0:
+        return 0
+    found = 0
+    frontier = []
+    if resume and os.path.exists(path):
+        saved_mode, saved_n, found, frontier = load_checkpoint(path)
+        if (saved_mode, saved_n) != (mode, n):
+            raise ValueError('{} holds a checkpoint for {} {}'.format(
+                path, saved_mode, saved_n))
+
+    half = n // 2
+    first = None
+    if mode != 'solve':
+        first = (1 << ((n + 1) // 2)) - 1
+    last = [time.time()]
+
+    def flushed(written):
+        if time.time() - last[0] >= interval:
+            save_checkpoint(path, mode, n, written, frontier)
+            last[0] = time.time()
+
+    if mode == 'count':
+        # only the left half of row 0 is walked, every solution there
+        # stands for itself and its mirror, except under the middle
+        # column where both are walked
+        walked = 0
+        for queens in _walk(n, first=first, frontier=frontier):
+            found += 1 if queens[0] == half and n % 2 else 2
+            walked += 1
+            if not walked & 0xfff:
+                flushed(found)
+    elif mode == 'count_distinct':
+        walked = 0
+        for queens in _walk(n, first=first, frontier=frontier):
+            if _is_smallest(n, queens):
+                found += 1
+            walked += 1
+            if not walked & 0xfff:
+                flushed(found)
+    else:
+        solutions = _solutions(n, first=first, distinct=(mode == 'distinct'),
+                               frontier=frontier)
+        found = write_solutions(solutions, stream, written=found,
+                                flushed=flushed)
+
+    if os.path.exists(path):
+        os.remove(path)
+    return found
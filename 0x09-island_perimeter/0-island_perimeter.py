@@ -2,6 +2,7 @@
 """
 this script calculates the island perimeter
 """
+from array import array
 
 
 def island_perimeter(grid):
@@ -21,3 +22,231 @@ def island_perimeter(grid):
                 if j > 0 and grid[i][j - 1] == 1:
                     perimeter -= 2
     return perimeter
+
+
+def row_runs(row):
+    """
+    returns the runs of land of a grid row, as (start, stop) pairs
+    like the bounds of a range
+    """
+    runs = []
+    start = None
+    for j, cell in enumerate(row):
+        if cell == 1:
+            if start is None:
+                start = j
+        elif start is not None:
+            runs.append((start, j))
+            start = None
+    if start is not None:
+        runs.append((start, len(row)))
+    return runs
+
+
+def _runs_perimeter(rows):
+    """
+    returns the perimeter of the land given by (i, runs) pairs, i
+    increasing, runs the sorted (start, stop) runs of land of row i
+
+    A run of length n has 2 * n + 2 sides; 2 of them are lost where
+    it touches the run before it in its row, and 2 for every cell it
+    shares with the runs of the row above, found by walking both rows
+    of runs together.
+    """
+    perimeter = 0
+    prev_i, prev = None, []
+    for i, runs in rows:
+        above = prev if prev_i == i - 1 else []
+        k = 0
+        last_stop = None
+        for start, stop in runs:
+            perimeter += 2 * (stop - start) + 2
+            if start == last_stop:
+                perimeter -= 2
+            last_stop = stop
+            while k < len(above) and above[k][1] <= start:
+                k += 1
+            m = k
+            while m < len(above) and above[m][0] < stop:
+                perimeter -= 2 * (min(stop, above[m][1]) -
+                                  max(start, above[m][0]))
+                m += 1
+        prev_i, prev = i, runs
+    return perimeter
+
+
+def _rows_items(rows):
+    """
+    returns (i, runs) pairs for the rows of a list or dict of runs
+    """
+    if isinstance(rows, dict):
+        return sorted((i, list(runs)) for i, runs in rows.items())
+    return ((i, list(runs)) for i, runs in enumerate(rows))
+
+
+def runs_perimeter(rows):
+    """
+    returns the perimeter of a grid given as runs of land: a list with
+    the runs of every row, or a dict mapping the rows with land to
+    theirs, each run being a (start, stop) pair of columns, sorted in
+    their row and not overlapping
+
+    The cost grows with the number of runs, not with the size of the
+    grid, so huge grids of mostly water are cheap.
+    """
+    return _runs_perimeter(_rows_items(rows))
+
+
+def _cells_runs(cells):
+    """
+    yields (i, runs) for the rows of a set of (row, column) cells
+    """
+    row, runs = None, []
+    for i, j in sorted(cells):
+        if i != row:
+            if runs:
+                yield row, runs
+            row, runs = i, [[j, j + 1]]
+        elif j == runs[-1][1]:
+            runs[-1][1] = j + 1
+        elif j > runs[-1][1]:
+            runs.append([j, j + 1])
+    if runs:
+        yield row, runs
+
+
+def cells_perimeter(cells):
+    """
+    returns the perimeter of a grid given as the (row, column) cells
+    of its land, grouped into runs of land row by row
+    """
+    return _runs_perimeter(_cells_runs(cells))
+
+
+def array_perimeter(grid, width=None, band_cells=1 << 22):
+    """
+    returns the same as island_perimeter for a 2D NumPy array, or a
+    bytes-like buffer of one byte per cell, row after row, width cells
+    to a row
+
+    The grid is read in bands of whole rows of about band_cells cells;
+    in each band the land cells and the pairs of land cells side by
+    side are counted on shifted views, plus the pairs across the edge
+    with the band above, and the perimeter is 4 * land - 2 * pairs.
+    Only one band is held as booleans at a time. Requires NumPy.
+    """
+    import numpy as np
+
+    if isinstance(grid, (bytes, bytearray, memoryview)):
+        if not width:
+            raise ValueError('width is needed for a bytes buffer')
+        grid = np.frombuffer(grid, dtype=np.uint8).reshape(-1, width)
+    else:
+        grid = np.asarray(grid)
+    rows, cols = grid.shape
+    step = max(1, band_cells // max(cols, 1))
+
+    land = pairs = 0
+    last = None
+    for top in range(0, rows, step):
+        band = grid[top:top + step] == 1
+        land += np.count_nonzero(band)
+        pairs += np.count_nonzero(band[:, 1:] & band[:, :-1])
+        pairs += np.count_nonzero(band[1:] & band[:-1])
+        if last is not None:
+            pairs += np.count_nonzero(last & band[0])
+        last = band[-1].copy()
+    return 4 * land - 2 * pairs
+
+
+def _find(parent, x):
+    """returns the root of x, halving the path on the way"""
+    while parent[x] != x:
+        parent[x] = parent[parent[x]]
+        x = parent[x]
+    return x
+
+
+def _union(parent, a, b):
+    """joins the sets of a and b under the smaller of their roots"""
+    a = _find(parent, a)
+    b = _find(parent, b)
+    if a < b:
+        parent[b] = a
+    elif b < a:
+        parent[a] = b
+
+
+def island_stats(rows):
+    """
+    returns the islands of a grid given as runs of land (like
+    runs_perimeter takes), in the order of their first cell, each as
+    a dict of its perimeter, area and bounding box, the last being
+    (top, left, bottom, right) with bottom and right excluded
+
+    One sweep over the rows numbers the runs and joins in a union-find
+    every run to the runs it touches, in its row and in the row above;
+    the perimeter each run adds (as in runs_perimeter) and its bounds
+    are kept in flat arrays indexed by run, with no object per run or
+    per cell, then added up by island.
+    """
+    parent = array('q')
+    row = array('q')
+    west = array('q')
+    east = array('q')
+    area = array('q')
+    sides = array('q')
+
+    prev_i, prev_first, prev = None, 0, []
+    for i, runs in _rows_items(rows):
+        first = len(parent)
+        if prev_i == i - 1:
+            above, base = prev, prev_first
+        else:
+            above, base = [], 0
+        count_above = len(above)
+        k = 0
+        last_stop = None
+        for start, stop in runs:
+            run = len(parent)
+            parent.append(run)
+            row.append(i)
+            west.append(start)
+            east.append(stop)
+            area.append(stop - start)
+            count = 2 * (stop - start) + 2
+            if start == last_stop:
+                count -= 2
+                _union(parent, run - 1, run)
+            last_stop = stop
+            while k < count_above and above[k][1] <= start:
+                k += 1
+            m = k
+            while m < count_above and above[m][0] < stop:
+                count -= 2 * (min(stop, above[m][1]) -
+                              max(start, above[m][0]))
+                _union(parent, base + m, run)
+                m += 1
+            sides.append(count)
+        prev_i, prev_first, prev = i, first, runs
+
+    # the root of an island is its first run, so its row is the top
+    # of the island and the other runs can be added to it in order
+    south = array('q', row)
+    roots = []
+    for run in range(len(parent)):
+        root = parent[run]
+        if root == run:
+            roots.append(run)
+            continue
+        root = _find(parent, root)
+        sides[root] += sides[run]
+        area[root] += area[run]
+        if west[run] < west[root]:
+            west[root] = west[run]
+        if east[run] > east[root]:
+            east[root] = east[run]
+        south[root] = row[run]
+    return [{'perimeter': sides[root], 'area': area[root],
+             'bbox': (row[root], west[root], south[root] + 1, east[root])}
+            for root in roots]
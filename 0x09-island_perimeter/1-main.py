@@ -0,0 +1,49 @@
+#!/usr/bin/python3
+"""
+1-main: checks array_perimeter against island_perimeter on the 0-main.py
+grid and on random grids, as NumPy arrays of several types and as bytes
+"""
+import random
+
+island = __import__('0-island_perimeter')
+island_perimeter = island.island_perimeter
+array_perimeter = island.array_perimeter
+
+if __name__ == "__main__":
+    try:
+        import numpy as np
+    except ImportError:
+        print("NumPy is not installed")
+        exit(0)
+
+    grid = [
+        [0, 0, 0, 0, 0, 0],
+        [0, 1, 0, 0, 0, 0],
+        [0, 1, 0, 0, 0, 0],
+        [0, 1, 1, 1, 0, 0],
+        [0, 0, 0, 0, 0, 0]
+    ]
+    print("{} {}".format(island_perimeter(grid), array_perimeter(grid)))
+
+    rand = random.Random(0)
+    wrong = 0
+    tries = 500
+    for _ in range(tries):
+        height, width = rand.randint(1, 30), rand.randint(1, 30)
+        land = rand.random()
+        # only 1 is land, any other value is water
+        grid = [[1 if rand.random() < land else rand.choice([0, 0, 2])
+                 for _ in range(width)] for _ in range(height)]
+        want = island_perimeter(grid)
+        # bands of 1 cell, a few rows, and the whole grid
+        for band_cells in (1, 3 * width, 1 << 22):
+            found = [array_perimeter(np.array(grid, dtype=dtype),
+                                     band_cells=band_cells)
+                     for dtype in (np.uint8, np.int32, np.int64)]
+            found.append(array_perimeter(
+                np.asfortranarray(np.array(grid)), band_cells=band_cells))
+            found.append(array_perimeter(
+                bytes(np.array(grid, dtype=np.uint8)), width, band_cells))
+            wrong += sum(1 for value in found if value != want)
+    print("{} random grids: {}".format(
+        tries, "OK" if not wrong else "{} differences".format(wrong)))